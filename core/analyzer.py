@@ -1,13 +1,75 @@
 import re
+import os
 import json
 from pathlib import Path
-import xml.etree.ElementTree as ET
+from lxml import etree
 from typing import Dict, List, Set
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+from core.utils import compile_pattern, build_automaton, build_literal_finder, iter_files, iter_literals, VulnStore
+
+# المسافات البيضاء التي يطابقها \s في نص Unicode (عدا \n) مُرمَّزة بـ UTF-8؛
+# تبقى خارج (?i:...) حتى لا يطابق re2 بايتاتها بحالة أحرف Latin-1 الأخرى
+WHITESPACE = rb'(?:[ \t\f\v\r\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80)*'
+
+# أنماط المعلومات الحساسة على مستوى البايتات (محصورة في سطر واحد كما في الفحص سطراً بسطر)؛
+# تجاهل حالة الأحرف يقتصر على ASCII فلا تطابق أحرف مثل ſ أو K كما في نمط Unicode
+SENSITIVE_PATTERNS = [
+    (rb'(?i:password)' + WHITESPACE + rb'=' + WHITESPACE + rb'["\'][^"\'\n]+["\']', 'كلمة مرور نصية'),
+    (rb'(?i:api[_-]?key)' + WHITESPACE + rb'=' + WHITESPACE + rb'["\'][^"\'\n]+["\']', 'مفتاح API'),
+    (rb'(?i:token)' + WHITESPACE + rb'=' + WHITESPACE + rb'["\'][^"\'\n]+["\']', 'Token'),
+]
+
+# نصوص حساسة ثابتة تُبحث بآلة Aho-Corasick بدلاً من التعابير النمطية
+SENSITIVE_LITERALS = [
+    ('http://', 'اتصال HTTP غير آمن'),
+    ('android:usesCleartextTraffic="true"', 'تصريح حركة نصية واضحة'),
+]
+
+# ترتيب الأنماط عند عرض نتائج السطر الواحد (كما في الفحص سطراً بسطر)
+SENSITIVE_ORDER = {issue: i for i, (_, issue) in enumerate(SENSITIVE_PATTERNS + SENSITIVE_LITERALS)}
+
+# نصوص WebView تُجمع في نفس الآلة وتُقيَّم قواعدها بعد المسح
+WEBVIEW_MARKERS = ['WebView', 'setJavaScriptEnabled(true)', 'setAllowFileAccess(false)']
+
+LITERAL_AUTOMATON = build_automaton(SENSITIVE_LITERALS + [(marker, marker) for marker in WEBVIEW_MARKERS])
+
+# عند غياب pyahocorasick تُضم النصوص الحساسة الثابتة إلى التعبير المُجمَّع
+if LITERAL_AUTOMATON is None:
+    SENSITIVE_PATTERNS += [(re.escape(literal.encode()), issue) for literal, issue in SENSITIVE_LITERALS]
+
+# دمج أنماط المعلومات الحساسة في تعبير واحد مُجمَّع مسبقاً؛ المجموعة رقم i+1
+# تقابل النمط رقم i لذا يجب ألا تحتوي الأنماط على مجموعات التقاط خاصة بها
+SENSITIVE_RE = compile_pattern(b'|'.join(b'(' + pattern + b')' for pattern, _ in SENSITIVE_PATTERNS))
+SENSITIVE_LABELS = {i: issue for i, (_, issue) in enumerate(SENSITIVE_PATTERNS, 1)}
+
+# الأذونات الخطيرة
+DANGEROUS_PERMS = frozenset({
+    'android.permission.READ_SMS',
+    'android.permission.SEND_SMS',
+    'android.permission.RECORD_AUDIO',
+    'android.permission.ACCESS_FINE_LOCATION',
+    'android.permission.CAMERA',
+    'android.permission.READ_CONTACTS',
+    'android.permission.WRITE_CONTACTS'
+})
+
+# درجة كل مستوى خطورة في حساب درجة الخطورة الكلية
+SEVERITY_SCORES = {'CRITICAL': 10, 'HIGH': 7, 'MEDIUM': 4, 'LOW': 2, 'INFO': 1}
+
+# محلل XML للـ Manifest يتجاهل النصوص الفارغة والتعليقات ولا يحلل الكيانات الخارجية
+MANIFEST_PARSER = etree.XMLParser(remove_blank_text=True, remove_comments=True, resolve_entities=False)
+
+# الحد الأدنى لعدد الملفات قبل توزيع الفحص على عدة عمليات
+PARALLEL_MIN_FILES = 64
 
 class SecurityAnalyzer:
     def __init__(self):
-        self.vulnerabilities = []
+        self.vulnerabilities = VulnStore()
         self.security_issues = []
+        self._manifest_tree = None
+        self._manifest_path = None
         self.load_patterns()
     
     def load_patterns(self):
@@ -20,10 +82,17 @@ class SecurityAnalyzer:
         """تحليل أمني شامل"""
         project_dir = Path(project_dir)
         
+        # إعادة تحليل AndroidManifest.xml مرة واحدة في كل تحليل شامل
+        self._manifest_path = None
+        
+        # أذونات الـ Manifest تُطابق أثناء فحص الكود نفسه بدلاً من مسح ثانٍ للملفات
+        manifest_analysis = self.analyze_manifest(project_dir)
+        code_analysis = self.analyze_code(project_dir, manifest_analysis.get('permissions', []))
+        
         results = {
-            'manifest_analysis': self.analyze_manifest(project_dir),
-            'code_analysis': self.analyze_code(project_dir),
-            'permission_analysis': self.analyze_permissions(project_dir),
+            'manifest_analysis': manifest_analysis,
+            'code_analysis': code_analysis,
+            'permission_analysis': self.analyze_permissions(project_dir, set(code_analysis['used_permissions'])),
             'resource_analysis': self.analyze_resources(project_dir),
             'vulnerabilities': [],
             'security_issues': [],
@@ -31,12 +100,14 @@ class SecurityAnalyzer:
         }
         
         # جمع جميع الثغرات
-        all_vulns = []
+        all_vulns = VulnStore()
         all_vulns.extend(results['manifest_analysis']['vulnerabilities'])
         all_vulns.extend(results['code_analysis']['vulnerabilities'])
         all_vulns.extend(results['permission_analysis']['vulnerabilities'])
         
-        results['vulnerabilities'] = all_vulns
+        # النتائج تبقى قائمة قابلة للتحويل إلى JSON؛ المخزن يُستخدم داخلياً فقط
+        results['vulnerabilities'] = all_vulns.records
+        self.vulnerabilities = all_vulns
         results['security_issues'] = self.security_issues
         
         # حساب درجة الخطورة
@@ -44,6 +115,16 @@ class SecurityAnalyzer:
         
         return results
     
+    def _get_manifest(self, project_dir):
+        """تحليل AndroidManifest.xml مرة واحدة وإعادة استخدام الشجرة"""
+        manifest_path = project_dir / 'manifest' / 'AndroidManifest.xml'
+        
+        if self._manifest_path != manifest_path:
+            self._manifest_tree = etree.parse(str(manifest_path), MANIFEST_PARSER)
+            self._manifest_path = manifest_path
+        
+        return self._manifest_tree.getroot()
+    
     def analyze_manifest(self, project_dir):
         """تحليل AndroidManifest.xml"""
         manifest_path = project_dir / 'manifest' / 'AndroidManifest.xml'
@@ -55,8 +136,7 @@ class SecurityAnalyzer:
         issues = []
         
         try:
-            tree = ET.parse(manifest_path)
-            root = tree.getroot()
+            root = self._get_manifest(project_dir)
             
             # تحليل الأذونات
             permissions = self.extract_permissions(root)
@@ -83,76 +163,156 @@ class SecurityAnalyzer:
             'issues': issues
         }
     
-    def analyze_code(self, project_dir):
-        """تحليل الكود بحثاً عن ثغرات"""
+    def analyze_code(self, project_dir, permissions=()):
+        """تحليل الكود بحثاً عن ثغرات وعن الأذونات المذكورة فيه"""
         java_dir = project_dir / 'java'
         smali_dir = project_dir / 'smali'
         
         vulnerabilities = []
+        files_analyzed = 0
+        used_permissions = set()
         
         # تحليل كود Java
         if java_dir.exists():
-            vulnerabilities.extend(self.analyze_java_code(java_dir))
+            java_vulns, java_files, used_permissions = self.analyze_java_code(java_dir, permissions)
+            vulnerabilities.extend(java_vulns)
+            files_analyzed += java_files
         
         # تحليل كود Smali
         if smali_dir.exists():
-            vulnerabilities.extend(self.analyze_smali_code(smali_dir))
+            smali_vulns, smali_files = self.analyze_smali_code(smali_dir)
+            vulnerabilities.extend(smali_vulns)
+            files_analyzed += smali_files
         
         return {
             'vulnerabilities': vulnerabilities,
-            'files_analyzed': self.count_files(java_dir) + self.count_files(smali_dir)
+            'files_analyzed': files_analyzed,
+            'used_permissions': sorted(used_permissions)
         }
     
-    def analyze_java_code(self, java_dir):
-        """تحليل كود Java"""
+    def analyze_java_code(self, java_dir, permissions=()):
+        """تحليل كود Java وإرجاع الثغرات وعدد الملفات المفحوصة والأذونات المستخدمة"""
+        files = list(iter_files(java_dir, '.java'))
         vulnerabilities = []
+        used_permissions = set()
         
-        # البحث عن معلومات حساسة
-        sensitive_patterns = [
-            (r'(?i)password\s*=\s*["\'][^"\']+["\']', 'كلمة مرور نصية'),
-            (r'(?i)api[_-]?key\s*=\s*["\'][^"\']+["\']', 'مفتاح API'),
-            (r'(?i)token\s*=\s*["\'][^"\']+["\']', 'Token'),
-            (r'http://', 'اتصال HTTP غير آمن'),
-            (r'android:usesCleartextTraffic="true"', 'تصريح حركة نصية واضحة'),
-        ]
+        # توزيع الملفات على عدة عمليات في المشاريع الكبيرة
+        if len(files) >= PARALLEL_MIN_FILES:
+            with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_worker,
+                                     initargs=(list(permissions),)) as executor:
+                for file_vulns, file_perms in executor.map(_scan_java_file, files, repeat(str(java_dir)), chunksize=32):
+                    vulnerabilities.extend(file_vulns)
+                    used_permissions.update(file_perms)
+        else:
+            permission_finder = build_literal_finder(permissions) if permissions else None
+            for file_path in files:
+                file_vulns, file_perms = self.scan_java_file(file_path, java_dir, permission_finder)
+                vulnerabilities.extend(file_vulns)
+                used_permissions.update(file_perms)
         
-        for file_path in java_dir.rglob('*.java'):
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                    line_num = 0
-                    for line in content.split('\n'):
-                        line_num += 1
-                        for pattern, issue in sensitive_patterns:
-                            if re.search(pattern, line):
-                                vulnerabilities.append({
-                                    'file': str(file_path.relative_to(java_dir)),
-                                    'line': line_num,
-                                    'type': 'SENSITIVE_DATA',
-                                    'severity': 'HIGH',
-                                    'description': f'معلومات حساسة: {issue}',
-                                    'code_snippet': line.strip()
-                                })
-                
-                # تحليل WebView
-                if 'WebView' in content:
-                    vulnerabilities.extend(self.analyze_webview_security(content, file_path))
-                
-                # تحليل قاعدة البيانات
-                vulnerabilities.extend(self.analyze_database_security(content, file_path))
-                
-            except:
+        return vulnerabilities, len(files), used_permissions
+    
+    def scan_java_file(self, file_path, java_dir, permission_finder=None):
+        """تحليل ملف Java واحد وإرجاع ثغراته والأذونات المذكورة فيه"""
+        vulnerabilities = []
+        used_permissions = set()
+        
+        try:
+            # فحص المحتوى كبايتات دون فك ترميزه
+            with open(file_path, 'rb') as f:
+                content = f.read()
+            
+            # مسح واحد لجميع النصوص الثابتة
+            literal_hits, markers = self.scan_literals(content)
+            
+            # البحث عن معلومات حساسة
+            vulnerabilities.extend(
+                self.find_sensitive_data(content, os.path.relpath(file_path, java_dir), literal_hits)
+            )
+            
+            # تحليل WebView
+            if 'WebView' in markers:
+                vulnerabilities.extend(self.analyze_webview_security(markers, file_path))
+            
+            # الأذونات المذكورة في الملف
+            if permission_finder is not None:
+                used_permissions = permission_finder(content)
+            
+            # تحليل قاعدة البيانات
+            vulnerabilities.extend(self.analyze_database_security(content, file_path))
+            
+        except:
+            pass
+        
+        return vulnerabilities, used_permissions
+    
+    def scan_literals(self, content):
+        """مسح النصوص الثابتة: مواضع النصوص الحساسة وعلامات WebView الموجودة"""
+        if LITERAL_AUTOMATON is None:
+            return [], {marker for marker in WEBVIEW_MARKERS if marker.encode() in content}
+        
+        hits = []
+        markers = set()
+        
+        # قيمة علامة WebView هي العلامة نفسها، وقيمة النص الحساس وصف المشكلة
+        for start, value in iter_literals(LITERAL_AUTOMATON, content):
+            if value in WEBVIEW_MARKERS:
+                markers.add(value)
+            else:
+                hits.append((start, value))
+        
+        return hits, markers
+    
+    def find_sensitive_data(self, content, relative_path, literal_hits=None):
+        """البحث عن معلومات حساسة في محتوى ملف بمسح واحد"""
+        if literal_hits is None:
+            literal_hits, _ = self.scan_literals(content)
+        hits = list(literal_hits)
+        
+        # البحث من الموضع التالي لبداية كل تطابق لالتقاط التطابقات المتداخلة
+        match = SENSITIVE_RE.search(content)
+        while match:
+            hits.append((match.start(), SENSITIVE_LABELS[match.lastindex]))
+            match = SENSITIVE_RE.search(content, match.start() + 1)
+        
+        found = []
+        seen = set()
+        line_num = 1
+        last_pos = 0
+        
+        for start, issue in sorted(hits):
+            line_num += content.count(b'\n', last_pos, start)
+            last_pos = start
+            
+            # نتيجة واحدة لكل نمط في كل سطر
+            if (line_num, issue) in seen:
                 continue
+            seen.add((line_num, issue))
+            
+            line_start = content.rfind(b'\n', 0, start) + 1
+            line_end = content.find(b'\n', start)
+            if line_end == -1:
+                line_end = len(content)
+            found.append((line_num, SENSITIVE_ORDER[issue], {
+                'file': str(relative_path),
+                'line': line_num,
+                'type': 'SENSITIVE_DATA',
+                'severity': 'HIGH',
+                'description': f'معلومات حساسة: {issue}',
+                'code_snippet': content[line_start:line_end].decode('utf-8', errors='ignore').strip()
+            }))
         
-        return vulnerabilities
+        # ترتيب نتائج كل سطر حسب ترتيب الأنماط بدلاً من موضعها في السطر
+        found.sort(key=lambda item: item[:2])
+        return [vuln for _, _, vuln in found]
     
-    def analyze_webview_security(self, content, file_path):
-        """تحليل إعدادات أمان WebView"""
+    def analyze_webview_security(self, markers, file_path):
+        """تحليل إعدادات أمان WebView من العلامات الموجودة في الملف"""
         issues = []
         
         # WebView بدون JavaScript مقيد
-        if 'setJavaScriptEnabled(true)' in content:
-            if 'setAllowFileAccess(false)' not in content:
+        if 'setJavaScriptEnabled(true)' in markers:
+            if 'setAllowFileAccess(false)' not in markers:
                 issues.append({
                     'file': str(file_path),
                     'type': 'WEBVIEW_INSECURE',
@@ -163,8 +323,8 @@ class SecurityAnalyzer:
         
         return issues
     
-    def analyze_permissions(self, project_dir):
-        """تحليل الأذونات"""
+    def analyze_permissions(self, project_dir, used_perms=None):
+        """تحليل الأذونات؛ used_perms هي الأذونات التي وجدها فحص الكود إن توفرت"""
         manifest_path = project_dir / 'manifest' / 'AndroidManifest.xml'
         
         if not manifest_path.exists():
@@ -173,24 +333,13 @@ class SecurityAnalyzer:
         vulnerabilities = []
         
         try:
-            tree = ET.parse(manifest_path)
-            root = tree.getroot()
+            root = self._get_manifest(project_dir)
             
             permissions = self.extract_permissions(root)
             
             # كشف الأذونات الخطيرة
-            dangerous_perms = [
-                'android.permission.READ_SMS',
-                'android.permission.SEND_SMS',
-                'android.permission.RECORD_AUDIO',
-                'android.permission.ACCESS_FINE_LOCATION',
-                'android.permission.CAMERA',
-                'android.permission.READ_CONTACTS',
-                'android.permission.WRITE_CONTACTS'
-            ]
-            
             for perm in permissions:
-                if perm in dangerous_perms:
+                if perm in DANGEROUS_PERMS:
                     vulnerabilities.append({
                         'type': 'DANGEROUS_PERMISSION',
                         'severity': 'MEDIUM',
@@ -199,8 +348,8 @@ class SecurityAnalyzer:
                     })
             
             # كشف أذونات غير ضرورية
-            code_dir = project_dir / 'java'
-            used_perms = self.detect_used_permissions(code_dir)
+            if used_perms is None:
+                used_perms = self.detect_used_permissions(project_dir / 'java', permissions)
             
             for perm in permissions:
                 if perm not in used_perms:
@@ -223,22 +372,51 @@ class SecurityAnalyzer:
             'vulnerabilities': vulnerabilities
         }
     
+    def detect_used_permissions(self, code_dir, permissions):
+        """كشف الأذونات المذكورة في الكود بمسح واحد لكل ملف"""
+        if not permissions or not code_dir.exists():
+            return set()
+        
+        finder = build_literal_finder(permissions)
+        used = set()
+        
+        for file_path in iter_files(code_dir, '.java'):
+            try:
+                with open(file_path, 'rb') as f:
+                    used.update(finder(f.read()))
+            except OSError:
+                continue
+        
+        return used
+    
     def calculate_risk_score(self, vulnerabilities):
         """حساب درجة الخطورة"""
-        severity_scores = {'CRITICAL': 10, 'HIGH': 7, 'MEDIUM': 4, 'LOW': 2, 'INFO': 1}
-        score = 0
-        
-        for vuln in vulnerabilities:
-            severity = vuln.get('severity', 'INFO')
-            score += severity_scores.get(severity, 1)
+        counts = vulnerabilities.severity_counts()
+        score = sum(SEVERITY_SCORES[severity] * count for severity, count in counts.items())
         
         return min(score, 100)
     
     def get_summary(self):
         """الحصول على ملخص التحليل"""
+        counts = self.vulnerabilities.severity_counts()
         return {
             'total_vulnerabilities': len(self.vulnerabilities),
-            'high_severity': len([v for v in self.vulnerabilities if v['severity'] == 'HIGH']),
-            'medium_severity': len([v for v in self.vulnerabilities if v['severity'] == 'MEDIUM']),
-            'low_severity': len([v for v in self.vulnerabilities if v['severity'] == 'LOW'])
-        }
\ No newline at end of file
+            'high_severity': counts['HIGH'],
+            'medium_severity': counts['MEDIUM'],
+            'low_severity': counts['LOW']
+        }
+
+
+# محلل وأداة مطابقة أذونات خاصان بكل عملية فرعية يُنشآن مرة واحدة عند بدء العملية
+_worker_analyzer = None
+_worker_finder = None
+
+def _init_worker(permissions):
+    """تهيئة محلل العملية الفرعية وأداة مطابقة الأذونات"""
+    global _worker_analyzer, _worker_finder
+    _worker_analyzer = SecurityAnalyzer()
+    _worker_finder = build_literal_finder(permissions) if permissions else None
+
+def _scan_java_file(file_path, java_dir):
+    """فحص ملف Java داخل عملية فرعية"""
+    return _worker_analyzer.scan_java_file(file_path, java_dir, _worker_finder)
\ No newline at end of file
@@ -1,12 +1,27 @@
 import subprocess
 import shutil
 import zipfile
+import mmap
+import time
 from pathlib import Path
 import hashlib
 import json
 import xml.etree.ElementTree as ET
 from androguard.core.apk import APK as AndroAPK
 
+# حجم القطعة عند نسخ الملفات المستخرجة من الأرشيف
+COPY_CHUNK_SIZE = 1 << 20
+
+# الفاصل الزمني (بالثواني) بين فحوص حالة APKTool وJadx
+PROCESS_POLL_INTERVAL = 0.1
+
+# مجلد الإخراج لكل بادئة داخل APK
+EXTRACT_TARGETS = {
+    'res/': 'resources',
+    'assets/': 'assets',
+    'lib/': 'libs',
+}
+
 class APKDisassembler:
     def __init__(self):
         self.tools = {
@@ -27,17 +42,21 @@ class APKDisassembler:
         # حفظ APK الأصلي
         shutil.copy2(apk_path, output_dir / 'original' / apk_path.name)
         
-        # استخراج معلومات APK
-        apk_info = self.extract_apk_info(apk_path, output_dir)
-        
-        # استخدام APKTool
-        self.run_apktool(apk_path, output_dir / 'smali')
-        
-        # استخدام Jadx
-        self.run_jadx(apk_path, output_dir / 'java')
-        
-        # تنظيم الملفات
-        self.organize_files(output_dir)
+        # تشغيل APKTool وJadx بالتوازي في عمليتين مستقلتين
+        processes = [self.run_apktool(apk_path, output_dir / 'smali')]
+        try:
+            processes.append(self.run_jadx(apk_path, output_dir / 'java'))
+            
+            # استخراج معلومات APK أثناء عمل الأداتين
+            apk_info = self.extract_apk_info(apk_path, output_dir)
+            
+            self.wait_for_processes(processes)
+        except:
+            # إيقاف ما تبقى من العمليات عند أي خطأ أو مقاطعة
+            for process in processes:
+                process.kill()
+                process.wait()
+            raise
         
         # حفظ المعلومات
         with open(output_dir / 'apk_info.json', 'w') as f:
@@ -49,106 +68,89 @@ class APKDisassembler:
         """استخراج معلومات APK باستخدام Androguard"""
         apk = AndroAPK(apk_path)
         
-        info = {
-            'package_name': apk.get_package(),
-            'version': apk.get_androidversion_code(),
-            'version_name': apk.get_androidversion_name(),
-            'min_sdk': apk.get_min_sdk_version(),
-            'target_sdk': apk.get_target_sdk_version(),
-            'sha256': self.calculate_hash(apk_path),
-            'permissions': apk.get_permissions(),
-            'activities': apk.get_activities(),
-            'services': apk.get_services(),
-            'receivers': apk.get_receivers(),
-            'providers': apk.get_providers(),
-            'libraries': apk.get_libraries(),
-            'files': list(apk.get_files())
-        }
-        
-        # استخراج AndroidManifest.xml
-        manifest_xml = apk.get_android_manifest_xml()
-        manifest_str = ET.tostring(manifest_xml, encoding='unicode')
-        
-        with open(output_dir / 'manifest' / 'AndroidManifest.xml', 'w') as f:
-            f.write(manifest_str)
+        # ربط ملف APK بالذاكرة مرة واحدة لحساب البصمة، وفتح الأرشيف من نفس الملف
+        with open(apk_path, 'rb') as apk_file, \
+                mmap.mmap(apk_file.fileno(), 0, access=mmap.ACCESS_READ) as mapping, \
+                zipfile.ZipFile(apk_file) as archive:
+            info = {
+                'package_name': apk.get_package(),
+                'version': apk.get_androidversion_code(),
+                'version_name': apk.get_androidversion_name(),
+                'min_sdk': apk.get_min_sdk_version(),
+                'target_sdk': apk.get_target_sdk_version(),
+                'sha256': hashlib.sha256(mapping).hexdigest(),
+                'permissions': apk.get_permissions(),
+                'activities': apk.get_activities(),
+                'services': apk.get_services(),
+                'receivers': apk.get_receivers(),
+                'providers': apk.get_providers(),
+                'libraries': apk.get_libraries(),
+                'files': list(apk.get_files())
+            }
         
-        # استخراج الموارد
-        self.extract_resources(apk, output_dir / 'resources')
+            # استخراج AndroidManifest.xml
+            manifest_xml = apk.get_android_manifest_xml()
+            manifest_str = ET.tostring(manifest_xml, encoding='unicode')
         
-        # استخراج الـ Assets
-        self.extract_assets(apk, output_dir / 'assets')
+            with open(output_dir / 'manifest' / 'AndroidManifest.xml', 'w') as f:
+                f.write(manifest_str)
         
-        # استخراج المكتبات
-        self.extract_libs(apk, output_dir / 'libs')
+            # استخراج الموارد والـ Assets والمكتبات
+            self._extract_all(archive, output_dir)
         
         return info
     
-    def calculate_hash(self, file_path):
-        """حساب البصمة الرقمية"""
-        sha256_hash = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
-    
     def run_apktool(self, apk_path, output_dir):
-        """تشغيل APKTool"""
+        """تشغيل APKTool في عملية مستقلة"""
         cmd = [self.tools['apktool'], 'd', str(apk_path), '-o', str(output_dir), '-f']
-        subprocess.run(cmd, check=True)
+        return subprocess.Popen(cmd)
     
     def run_jadx(self, apk_path, output_dir):
-        """تشغيل Jadx"""
+        """تشغيل Jadx في عملية مستقلة"""
         cmd = [self.tools['jadx'], str(apk_path), '-d', str(output_dir), '--deobf']
-        subprocess.run(cmd, check=True)
+        return subprocess.Popen(cmd)
     
-    def extract_resources(self, apk, output_dir):
-        """استخراج الموارد"""
-        resources = apk.get_files()
-        for resource in resources:
-            if resource.startswith('res/'):
-                try:
-                    data = apk.get_file(resource)
-                    resource_path = output_dir / resource
-                    resource_path.parent.mkdir(parents=True, exist_ok=True)
-                    with open(resource_path, 'wb') as f:
-                        f.write(data)
-                except:
+    def wait_for_processes(self, processes):
+        """انتظار انتهاء جميع العمليات ورفع الخطأ فور فشل إحداها"""
+        pending = list(processes)
+        while pending:
+            for process in list(pending):
+                returncode = process.poll()
+                if returncode is None:
                     continue
+                pending.remove(process)
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(returncode, process.args)
+            
+            if pending:
+                time.sleep(PROCESS_POLL_INTERVAL)
     
-    def extract_assets(self, apk, output_dir):
-        """استخراج Assets"""
-        assets = [f for f in apk.get_files() if f.startswith('assets/')]
-        for asset in assets:
-            try:
-                data = apk.get_file(asset)
-                asset_path = output_dir / asset
-                asset_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(asset_path, 'wb') as f:
-                    f.write(data)
-            except:
+    def _extract_all(self, archive, output_dir):
+        """استخراج الموارد والـ Assets والمكتبات في مرور واحد"""
+        prefixes = tuple(EXTRACT_TARGETS)
+        roots = {prefix: (output_dir / folder).resolve() for prefix, folder in EXTRACT_TARGETS.items()}
+        created_dirs = set()
+        
+        for entry in archive.infolist():
+            name = entry.filename
+            # تجاهل مدخلات المجلدات والملفات خارج البادئات المطلوبة
+            if not name.startswith(prefixes) or entry.is_dir():
+                continue
+            # تجاهل المسارات التي قد تخرج من مجلد الإخراج (Zip Slip)
+            parts = name.replace('\\', '/').split('/')
+            if '..' in parts or any(':' in part for part in parts):
                 continue
-    
-    def extract_libs(self, apk, output_dir):
-        """استخراج المكتبات"""
-        libs = [f for f in apk.get_files() if f.startswith('lib/')]
-        for lib in libs:
             try:
-                data = apk.get_file(lib)
-                lib_path = output_dir / lib
-                lib_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(lib_path, 'wb') as f:
-                    f.write(data)
+                prefix = name[:name.index('/') + 1]
+                target = output_dir / EXTRACT_TARGETS[prefix] / name
+                if not target.resolve().is_relative_to(roots[prefix]):
+                    continue
+                if target.parent not in created_dirs:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    created_dirs.add(target.parent)
+                
+                # فك الضغط مباشرة إلى ملف الإخراج دون تحميل المحتوى كاملاً في الذاكرة
+                with archive.open(entry) as src, open(target, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
             except:
-                continue
-    
-    def organize_files(self, output_dir):
-        """تنظيم الملفات في هيكل منظم"""
-        # نقل ملفات APKTool
-        smali_dir = output_dir / 'smali'
-        if smali_dir.exists():
-            # البحث عن ملفات smali
-            for smali_file in smali_dir.rglob('*.smali'):
-                relative = smali_file.relative_to(smali_dir)
-                target = output_dir / 'smali' / relative
-                target.parent.mkdir(parents=True, exist_ok=True)
-                shutil.move(str(smali_file), str(target))
\ No newline at end of file
+                continue
\ No newline at end of file
@@ -1,12 +1,44 @@
 from pathlib import Path
+import io
 import json
 import markdown
 from datetime import datetime
 import pdfkit
+from jinja2 import Environment, FileSystemLoader
+
+from core.utils import VulnStore
+
+TEMPLATES_DIR = Path(__file__).parent.parent / 'templates'
+
+# قالب HTML يُجمَّع مرة واحدة عند الاستيراد
+HTML_TEMPLATE = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True).get_template('report.html.j2')
+
+# محوّل Markdown واحد يُعاد ضبطه بين التقارير بدلاً من إنشائه لكل تقرير
+MARKDOWN_CONVERTER = markdown.Markdown(extensions=['fenced_code', 'nl2br', 'sane_lists'])
+
+# محتوى التقرير مصدره APK قيد التحليل؛ تعطيل تمرير HTML الخام حتى يُعرض كنص،
+# وتعطيل الروابط والصور (لا يستخدمها التقرير) لمنع روابط javascript: والتحميل الخارجي
+MARKDOWN_CONVERTER.preprocessors.deregister('html_block')
+for pattern in ('html', 'link', 'image_link', 'reference', 'image_reference',
+                'short_reference', 'short_image_ref', 'autolink', 'automail'):
+    MARKDOWN_CONVERTER.inlinePatterns.deregister(pattern)
+
+# التقرير يكتب كل حقل في سطر مستقل ويتبع السطر بفاصل "---" مباشرة؛
+# تعطيل عناوين setext حتى يُعرض الفاصل خطاً أفقياً لا عنواناً
+MARKDOWN_CONVERTER.parser.blockprocessors.deregister('setextheader')
+
+# قوالب كل ثغرة في التقرير؛ الحقول الاختيارية تُكتب فقط عند وجودها
+VULN_HEADER_TEMPLATE = "#### {index}. {description}\n**النوع:** {type}\n"
+VULN_FIELD_TEMPLATES = [
+    ('file', "**الملف:** `{file}`\n"),
+    ('line', "**السطر:** {line}\n"),
+    ('code_snippet', "**مقتطف الكود:**\n```java\n{code_snippet}\n```\n"),
+    ('recommendation', "**التوصية:** {recommendation}\n"),
+]
 
 class ReportGenerator:
     def __init__(self):
-        self.templates_dir = Path(__file__).parent.parent / 'templates'
+        self.templates_dir = TEMPLATES_DIR
     
     def generate_report(self, analysis_results, format='md'):
         """إنشاء تقرير"""
@@ -33,6 +65,38 @@ class ReportGenerator:
         
         return report_file
     
+    def generate_html(self, analysis_results, timestamp):
+        """إنشاء تقرير HTML"""
+        html_content = self.render_html(self.create_report_content(analysis_results))
+        
+        report_dir = Path('reports')
+        report_dir.mkdir(exist_ok=True)
+        
+        report_file = report_dir / f'report_{timestamp}.html'
+        
+        with open(report_file, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+        
+        return report_file
+    
+    def generate_pdf(self, analysis_results, timestamp):
+        """إنشاء تقرير PDF"""
+        html_content = self.render_html(self.create_report_content(analysis_results))
+        
+        report_dir = Path('reports')
+        report_dir.mkdir(exist_ok=True)
+        
+        report_file = report_dir / f'report_{timestamp}.pdf'
+        pdfkit.from_string(html_content, str(report_file), options={'encoding': 'UTF-8'})
+        
+        return report_file
+    
+    def render_html(self, report_content):
+        """تحويل محتوى التقرير من Markdown إلى صفحة HTML"""
+        MARKDOWN_CONVERTER.reset()
+        body = MARKDOWN_CONVERTER.convert(report_content)
+        return HTML_TEMPLATE.render(title='تقرير التحليل الأمني لتطبيق Android', body=body)
+    
     def create_report_content(self, analysis_results):
         """إنشاء محتوى التقرير"""
         content = []
@@ -46,13 +110,12 @@ class ReportGenerator:
         content.append("## 1. الملخص التنفيذي")
         content.append(f"**درجة الخطورة:** {analysis_results['risk_score']}/100")
         
-        vuln_counts = {
-            'HIGH': len([v for v in analysis_results['vulnerabilities'] if v['severity'] == 'HIGH']),
-            'MEDIUM': len([v for v in analysis_results['vulnerabilities'] if v['severity'] == 'MEDIUM']),
-            'LOW': len([v for v in analysis_results['vulnerabilities'] if v['severity'] == 'LOW'])
-        }
+        vulnerabilities = analysis_results['vulnerabilities']
+        if not isinstance(vulnerabilities, VulnStore):
+            vulnerabilities = VulnStore(vulnerabilities)
+        vuln_counts = vulnerabilities.severity_counts()
         
-        content.append(f"**إجمالي الثغرات:** {len(analysis_results['vulnerabilities'])}")
+        content.append(f"**إجمالي الثغرات:** {len(vulnerabilities)}")
         content.append(f"  - **عالية الخطورة:** {vuln_counts['HIGH']}")
         content.append(f"  - **متوسطة الخطورة:** {vuln_counts['MEDIUM']}")
         content.append(f"  - **منخفضة الخطورة:** {vuln_counts['LOW']}")
@@ -73,28 +136,11 @@ class ReportGenerator:
         content.append("## 3. الثغرات الأمنية المكتشفة")
         
         for severity in ['HIGH', 'MEDIUM', 'LOW']:
-            vulns = [v for v in analysis_results['vulnerabilities'] if v['severity'] == severity]
+            vulns = vulnerabilities.by_severity(severity)
             if vulns:
                 content.append(f"### {severity} - خطورة {self.get_severity_arabic(severity)}")
                 
-                for i, vuln in enumerate(vulns, 1):
-                    content.append(f"#### {i}. {vuln.get('description', 'ثغرة')}")
-                    content.append(f"**النوع:** {vuln.get('type', 'غير معروف')}")
-                    
-                    if 'file' in vuln:
-                        content.append(f"**الملف:** `{vuln['file']}`")
-                    
-                    if 'line' in vuln:
-                        content.append(f"**السطر:** {vuln['line']}")
-                    
-                    if 'code_snippet' in vuln:
-                        content.append("**مقتطف الكود:**")
-                        content.append(f"```java\n{vuln['code_snippet']}\n```")
-                    
-                    if 'recommendation' in vuln:
-                        content.append(f"**التوصية:** {vuln['recommendation']}")
-                    
-                    content.append("---")
+                content.append(self.render_vulnerabilities(vulns))
                 content.append("\n")
         
         # تحليل الأذونات
@@ -123,6 +169,24 @@ class ReportGenerator:
         
         return "\n".join(content)
     
+    def render_vulnerabilities(self, vulns):
+        """تنسيق قائمة ثغرات بالقوالب المُعدة مسبقاً"""
+        buf = io.StringIO()
+        
+        for i, vuln in enumerate(vulns, 1):
+            buf.write(VULN_HEADER_TEMPLATE.format(
+                index=i,
+                description=vuln.get('description', 'ثغرة'),
+                type=vuln.get('type', 'غير معروف')
+            ))
+            for field, template in VULN_FIELD_TEMPLATES:
+                if field in vuln:
+                    buf.write(template.format_map(vuln))
+            buf.write("---\n")
+        
+        # بدون السطر الجديد الأخير لأن أقسام التقرير تُدمج بـ "\n"
+        return buf.getvalue()[:-1]
+    
     def get_severity_arabic(self, severity):
         """تحويل درجة الخطورة للعربية"""
         mapping = {
@@ -0,0 +1,116 @@
+import os
+import re
+from array import array
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def compile_pattern(pattern):
+    """تجميع تعبير نمطي بمحرك RE2 (زمن خطي) إن توفر، مع الرجوع إلى re"""
+    if re2 is not None:
+        try:
+            if isinstance(pattern, bytes):
+                # مطابقة البايتات كما هي دون افتراض ترميز UTF-8
+                options = re2.Options()
+                options.encoding = re2.Options.Encoding.LATIN1
+                return re2.compile(pattern, options)
+            return re2.compile(pattern)
+        except re2.error:
+            # الأنماط غير المدعومة في RE2 (مثل المراجع الخلفية) تمر عبر re
+            pass
+    return re.compile(pattern)
+
+
+def build_automaton(words):
+    """بناء آلة Aho-Corasick لمجموعة نصوص ثابتة، أو None إن لم تتوفر pyahocorasick"""
+    if ahocorasick is None:
+        return None
+    
+    # المفاتيح بايتات UTF-8 مفكوكة بـ latin-1 كما يفك iter_literals المحتوى
+    automaton = ahocorasick.Automaton()
+    for word, value in words:
+        key = word.encode().decode('latin-1')
+        automaton.add_word(key, (len(key), value))
+    automaton.make_automaton()
+    return automaton
+
+
+def iter_literals(automaton, content):
+    """مسح محتوى بايتات بآلة build_automaton وإرجاع (موضع البداية بالبايتات، القيمة) لكل تطابق"""
+    # pyahocorasick يعمل على النصوص؛ فك الترميز بـ latin-1 نسخ مباشر يحافظ على مواضع البايتات
+    for end, (length, value) in automaton.iter(content.decode('latin-1')):
+        yield end - length + 1, value
+
+
+def build_literal_finder(words):
+    """بناء دالة تعيد النصوص الثابتة الموجودة في محتوى بايتات بمسح واحد"""
+    automaton = build_automaton((word, word) for word in words)
+    
+    if automaton is None:
+        encoded = [(word.encode(), word) for word in words]
+        return lambda content: {word for raw, word in encoded if raw in content}
+    
+    return lambda content: {word for _, word in iter_literals(automaton, content)}
+
+
+def iter_files(root, suffix):
+    """التجول في مجلد باستخدام os.scandir وإرجاع مسارات الملفات المنتهية بلاحقة كنصوص"""
+    stack = [os.fspath(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(suffix):
+                        yield entry.path
+        except OSError:
+            continue
+
+
+# ترميز درجات الخطورة بأعداد صغيرة لتخزينها في مصفوفة متجاورة
+SEVERITY_LEVELS = ['INFO', 'LOW', 'MEDIUM', 'HIGH', 'CRITICAL']
+SEVERITY_CODES = {severity: code for code, severity in enumerate(SEVERITY_LEVELS)}
+
+
+class VulnStore:
+    """مخزن الثغرات مع عمود متجاور لدرجات الخطورة"""
+    
+    def __init__(self, vulnerabilities=()):
+        self.severity = array('B')
+        self.records = []
+        self.extend(vulnerabilities)
+    
+    def append(self, vuln):
+        """إضافة ثغرة (الدرجات غير المعروفة تُعامل كـ INFO)"""
+        self.severity.append(SEVERITY_CODES.get(vuln.get('severity'), 0))
+        self.records.append(vuln)
+    
+    def extend(self, vulnerabilities):
+        """إضافة مجموعة ثغرات"""
+        for vuln in vulnerabilities:
+            self.append(vuln)
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def __iter__(self):
+        return iter(self.records)
+    
+    def severity_counts(self):
+        """عدد الثغرات لكل درجة خطورة بمسح العمود المتجاور"""
+        return {severity: self.severity.count(code) for severity, code in SEVERITY_CODES.items()}
+    
+    def by_severity(self, severity):
+        """الثغرات ذات درجة خطورة محددة بترتيب إضافتها"""
+        target = SEVERITY_CODES[severity]
+        return [record for record, code in zip(self.records, self.severity) if code == target]